@@ -0,0 +1,192 @@
+// Native version of BinOpAst parse + simplify_binops + prefix_str for large inputs.
+// Build with `python setup.py build_ext --inplace`; binexp_parser.simplify_prefix falls
+// back to the Python implementation when this module is not importable.
+#include <pybind11/pybind11.h>
+
+#include <charconv>
+#include <cstdint>
+#include <stdexcept>
+#include <string>
+#include <string_view>
+#include <utility>
+#include <vector>
+
+namespace py = pybind11;
+
+namespace {
+
+enum : uint8_t { OP_NUM, OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_OTHER };
+
+struct Node {
+    uint8_t op;
+    int32_t l, r;
+    int32_t src;  // token this node prints as, or -1 for a number computed by folding
+    int64_t num;  // value of a computed number
+};
+
+std::vector<std::string_view> split(const std::string &input) {
+    std::vector<std::string_view> tokens;
+    const char *ws = " \t\n\r\f\v";
+    std::string_view s(input);
+    size_t pos = s.find_first_not_of(ws);
+    while (pos != std::string_view::npos) {
+        size_t end = s.find_first_of(ws, pos);
+        if (end == std::string_view::npos) end = s.size();
+        tokens.push_back(s.substr(pos, end - pos));
+        pos = s.find_first_not_of(ws, end);
+    }
+    return tokens;
+}
+
+uint8_t op_code(std::string_view tok) {
+    if (tok[0] >= '0' && tok[0] <= '9') return OP_NUM;
+    if (tok.size() == 1) {
+        switch (tok[0]) {
+            case '+': return OP_ADD;
+            case '-': return OP_SUB;
+            case '*': return OP_MUL;
+            case '/': return OP_DIV;
+        }
+    }
+    return OP_OTHER;
+}
+
+class Tree {
+public:
+    explicit Tree(const std::string &input) : tokens_(split(input)) {
+        if (tokens_.empty())
+            throw std::invalid_argument("Cannot initialize BinOpAst with an empty prefix list.");
+        nodes_.reserve(tokens_.size());
+        // Pending child slots, encoded as parent * 2 + (1 for right, 0 for left)
+        std::vector<int32_t> slots;
+        size_t i = 0;
+        while (true) {
+            int32_t idx = static_cast<int32_t>(nodes_.size());
+            uint8_t op = op_code(tokens_[i]);
+            nodes_.push_back({op, -1, -1, static_cast<int32_t>(i), 0});
+            ++i;
+            if (idx > 0) {
+                int32_t slot = slots.back();
+                slots.pop_back();
+                if (slot & 1)
+                    nodes_[slot >> 1].r = idx;
+                else
+                    nodes_[slot >> 1].l = idx;
+            }
+            if (op != OP_NUM) {
+                slots.push_back(2 * idx + 1);
+                slots.push_back(2 * idx);
+            }
+            if (slots.empty()) break;
+            if (i == tokens_.size())
+                throw std::invalid_argument("Ran out of tokens while building BinOpAst.");
+        }
+    }
+
+    // Same rules, in the same order, as OpNode._simplify_rule
+    void simplify() {
+        std::vector<std::pair<int32_t, bool>> stack{{0, false}};
+        while (!stack.empty()) {
+            auto [i, visited] = stack.back();
+            stack.pop_back();
+            Node &node = nodes_[i];
+            if (node.op == OP_NUM) continue;
+            if (!visited) {
+                stack.push_back({i, true});
+                stack.push_back({node.r, false});
+                stack.push_back({node.l, false});
+                continue;
+            }
+            const uint8_t op = node.op;
+            const int32_t l = node.l, r = node.r;
+            const bool lz = is_leaf(l, "0"), rz = is_leaf(r, "0");
+            if (op == OP_MUL && (lz || rz)) {
+                node = {OP_NUM, -1, -1, -1, 0};
+                continue;
+            }
+            if (op == OP_ADD && lz) { node = nodes_[r]; continue; }
+            if ((op == OP_ADD || op == OP_SUB) && rz) { node = nodes_[l]; continue; }
+            if (op == OP_MUL && is_leaf(l, "1")) { node = nodes_[r]; continue; }
+            if ((op == OP_MUL || op == OP_DIV) && is_leaf(r, "1")) { node = nodes_[l]; continue; }
+            if (nodes_[l].op == OP_NUM && nodes_[r].op == OP_NUM) fold(node);
+        }
+    }
+
+    std::string prefix_str() const {
+        std::string out;
+        std::vector<int32_t> stack{0};
+        while (!stack.empty()) {
+            const Node &node = nodes_[stack.back()];
+            stack.pop_back();
+            if (!out.empty()) out.push_back(' ');
+            if (node.src >= 0)
+                out.append(tokens_[node.src]);
+            else
+                out.append(std::to_string(node.num));
+            if (node.op != OP_NUM) {
+                stack.push_back(node.r);
+                stack.push_back(node.l);
+            }
+        }
+        return out;
+    }
+
+private:
+    bool is_leaf(int32_t i, std::string_view text) const {
+        const Node &node = nodes_[i];
+        if (node.op != OP_NUM) return false;
+        if (node.src >= 0) return tokens_[node.src] == text;
+        return node.num == text[0] - '0';
+    }
+
+    int64_t value(const Node &node) const {
+        if (node.src < 0) return node.num;
+        std::string_view tok = tokens_[node.src];
+        int64_t v = 0;
+        auto [end, ec] = std::from_chars(tok.data(), tok.data() + tok.size(), v);
+        if (ec == std::errc::result_out_of_range)
+            throw std::overflow_error("Number does not fit in 64 bits.");
+        if (ec != std::errc() || end != tok.data() + tok.size())
+            throw std::invalid_argument("Invalid numeric token.");
+        return v;
+    }
+
+    // Replace node with its value; division by zero and negative results are left
+    // unfolded, matching binexp_parser._fold
+    void fold(Node &node) const {
+        const int64_t a = value(nodes_[node.l]), b = value(nodes_[node.r]);
+        int64_t result;
+        bool overflow = false;
+        switch (node.op) {
+            case OP_ADD: overflow = __builtin_add_overflow(a, b, &result); break;
+            case OP_SUB: overflow = __builtin_sub_overflow(a, b, &result); break;
+            case OP_MUL: overflow = __builtin_mul_overflow(a, b, &result); break;
+            case OP_DIV:
+                if (b == 0) return;
+                result = a / b;
+                break;
+            default: return;
+        }
+        if (overflow) throw std::overflow_error("Folded value does not fit in 64 bits.");
+        if (result < 0) return;
+        node = {OP_NUM, -1, -1, -1, result};
+    }
+
+    std::vector<std::string_view> tokens_;
+    std::vector<Node> nodes_;
+};
+
+std::string simplify_prefix(const std::string &input) {
+    Tree tree(input);
+    tree.simplify();
+    return tree.prefix_str();
+}
+
+}  // namespace
+
+PYBIND11_MODULE(_binexp_ext, m) {
+    m.doc() = "Native BinOpAst simplifier over prefix notation strings.";
+    m.def("simplify_prefix", &simplify_prefix, py::arg("input"),
+          py::call_guard<py::gil_scoped_release>(),
+          "Parse a prefix expression, apply simplify_binops and return it in prefix notation.");
+}
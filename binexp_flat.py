@@ -0,0 +1,301 @@
+#!/usr/bin/python3
+"""
+A flat array encoding of BinOpAst for large trees. Nodes live in parallel NumPy arrays indexed in
+prefix order, so node i starts out as token i, and the parser, simplifier and prefix walk are
+compiled with Numba when it is installed.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Without Numba the kernels run as plain Python over the same arrays
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+# Node op codes. OP_OTHER is any operator token the simplifier has no rules for.
+OP_NUM = 0
+OP_ADD = 1
+OP_MUL = 2
+OP_SUB = 3
+OP_DIV = 4
+OP_OTHER = 5
+
+_OP_CODES = {'+': OP_ADD, '*': OP_MUL, '-': OP_SUB, '/': OP_DIV}
+
+# Largest foldable value; folds that would exceed it raise OverflowError instead of wrapping
+_INT64_MAX = 2 ** 63 - 1
+
+# First characters of a numeric token; tokens are ASCII integers
+_DIGITS = frozenset('0123456789')
+
+def encode(tokens):
+    """
+    Convert prefix tokens to the (codes, nums) arrays taken by build(). Raises ValueError for a
+    number with a leading zero: BinOpAst only applies the identity rules to the exact tokens '0'
+    and '1', and the arrays keep values rather than token text.
+    """
+    n = len(tokens)
+    codes = np.empty(n, np.int32)
+    nums = np.zeros(n, np.int64)
+    for i, tok in enumerate(tokens):
+        if tok and tok[0] in _DIGITS:
+            if tok[0] == '0' and len(tok) > 1:
+                raise ValueError(f"Number {tok!r} has a leading zero.")
+            codes[i] = OP_NUM
+            nums[i] = int(tok)
+        else:
+            codes[i] = _OP_CODES.get(tok, OP_OTHER)
+    return codes, nums
+
+@njit(cache=True)
+def build(codes, nums):
+    """
+    Build the node arrays (op, left, right, value, src) from encoded prefix tokens. src is the
+    token each node prints as, or -1 for a number computed during simplification.
+    """
+    n = codes.shape[0]
+    if n == 0:
+        raise ValueError("Cannot initialize BinOpAst with an empty prefix list.")
+    op = codes.copy()
+    value = nums.copy()
+    left = np.full(n, -1, np.int32)
+    right = np.full(n, -1, np.int32)
+    src = np.arange(n).astype(np.int32)
+    # Pending child slots, encoded as parent * 2 + (1 for right, 0 for left)
+    stack = np.empty(n + 1, np.int32)
+    sp = 0
+    i = 0
+    while True:
+        if i > 0:
+            sp -= 1
+            slot = stack[sp]
+            if slot & 1:
+                right[slot >> 1] = i
+            else:
+                left[slot >> 1] = i
+        if op[i] != OP_NUM:
+            stack[sp] = 2 * i + 1
+            stack[sp + 1] = 2 * i
+            sp += 2
+        i += 1
+        if sp == 0:
+            return op[:i], left[:i], right[:i], value[:i], src[:i]
+        if i == n:
+            raise ValueError("Ran out of tokens while building BinOpAst.")
+
+@njit(cache=True)
+def _copy_node(op, left, right, value, src, dst, i):
+    op[dst] = op[i]
+    left[dst] = left[i]
+    right[dst] = right[i]
+    value[dst] = value[i]
+    src[dst] = src[i]
+
+@njit(cache=True)
+def simplify(op, left, right, value, src):
+    """
+    Apply the same rules as BinOpAst.simplify_binops to the tree rooted at node 0, in place,
+    with an iterative post-order walk. Raises OverflowError if a fold does not fit in 64 bits,
+    leaving the arrays partly simplified.
+    """
+    n = op.shape[0]
+    stack = np.empty(2 * n + 1, np.int32)
+    visited = np.empty(2 * n + 1, np.bool_)
+    stack[0] = 0
+    visited[0] = False
+    sp = 1
+    while sp > 0:
+        sp -= 1
+        i = stack[sp]
+        o = op[i]
+        if o == OP_NUM:
+            continue
+        l = left[i]
+        r = right[i]
+        if not visited[sp]:
+            visited[sp] = True
+            sp += 1
+            stack[sp] = r
+            visited[sp] = False
+            stack[sp + 1] = l
+            visited[sp + 1] = False
+            sp += 2
+            continue
+        lnum = op[l] == OP_NUM
+        rnum = op[r] == OP_NUM
+        lval = value[l]
+        rval = value[r]
+        if o == OP_MUL and ((lnum and lval == 0) or (rnum and rval == 0)):
+            op[i] = OP_NUM
+            left[i] = -1
+            right[i] = -1
+            value[i] = 0
+            src[i] = -1
+            continue
+        if o == OP_ADD and lnum and lval == 0:
+            _copy_node(op, left, right, value, src, i, r)
+            continue
+        if (o == OP_ADD or o == OP_SUB) and rnum and rval == 0:
+            _copy_node(op, left, right, value, src, i, l)
+            continue
+        if o == OP_MUL and lnum and lval == 1:
+            _copy_node(op, left, right, value, src, i, r)
+            continue
+        if (o == OP_MUL or o == OP_DIV) and rnum and rval == 1:
+            _copy_node(op, left, right, value, src, i, l)
+            continue
+        if not (lnum and rnum):
+            continue
+        # Values are never negative, so only + and * can overflow
+        if o == OP_ADD:
+            if lval > _INT64_MAX - rval:
+                raise OverflowError("Folded value does not fit in 64 bits.")
+            result = lval + rval
+        elif o == OP_SUB:
+            result = lval - rval
+        elif o == OP_MUL:
+            if lval != 0 and rval > _INT64_MAX // lval:
+                raise OverflowError("Folded value does not fit in 64 bits.")
+            result = lval * rval
+        elif o == OP_DIV and rval != 0:
+            result = lval // rval
+        else:
+            continue
+        # Negative numbers are not valid tokens, so leave those unfolded
+        if result >= 0:
+            op[i] = OP_NUM
+            left[i] = -1
+            right[i] = -1
+            value[i] = result
+            src[i] = -1
+
+@njit(cache=True)
+def prefix_order(op, left, right):
+    """
+    Return the node indices reachable from node 0 in prefix order.
+    """
+    n = op.shape[0]
+    order = np.empty(n, np.int32)
+    stack = np.empty(n + 1, np.int32)
+    stack[0] = 0
+    sp = 1
+    count = 0
+    while sp > 0:
+        sp -= 1
+        i = stack[sp]
+        order[count] = i
+        count += 1
+        if op[i] != OP_NUM:
+            stack[sp] = right[i]
+            stack[sp + 1] = left[i]
+            sp += 2
+    return order[:count]
+
+@njit(cache=True)
+def simplify_many(codes, nums, offsets):
+    """
+    Build, simplify and order every tree in a batch in one call. Tree t is encoded in
+    codes[offsets[t]:offsets[t + 1]]. Returns (out_offsets, out_src, out_value): the printed
+    nodes of tree t are out_offsets[t]:out_offsets[t + 1], each either a token index into the
+    whole batch or -1 with its computed value.
+    """
+    n_trees = offsets.shape[0] - 1
+    out_offsets = np.empty(n_trees + 1, np.int32)
+    out_src = np.empty(codes.shape[0], np.int32)
+    out_value = np.empty(codes.shape[0], np.int64)
+    out_offsets[0] = 0
+    pos = 0
+    for t in range(n_trees):
+        start = offsets[t]
+        end = offsets[t + 1]
+        op, left, right, value, src = build(codes[start:end], nums[start:end])
+        simplify(op, left, right, value, src)
+        for i in prefix_order(op, left, right):
+            s = src[i]
+            out_src[pos] = s + start if s >= 0 else -1
+            out_value[pos] = value[i]
+            pos += 1
+        out_offsets[t + 1] = pos
+    return out_offsets, out_src, out_value
+
+def simplify_batch(token_lists):
+    """
+    Apply simplify_binops to many prefix token lists with a single simplify_many call and
+    return the results in prefix notation, in order. If any number has a leading zero or any
+    value does not fit in 64 bits, each tree is processed on its own through FlatAst instead.
+    """
+    token_lists = [list(token_list) for token_list in token_lists]
+    tokens = []
+    offsets = [0]
+    for token_list in token_lists:
+        tokens.extend(token_list)
+        offsets.append(len(tokens))
+    try:
+        codes, nums = encode(tokens)
+        out_offsets, out_src, out_value = simplify_many(codes, nums, np.array(offsets, np.int32))
+    except (OverflowError, ValueError):
+        results = []
+        for token_list in token_lists:
+            tree = FlatAst(token_list)
+            tree.simplify_binops()
+            results.append(tree.prefix_str())
+        return results
+    results = []
+    for t in range(len(offsets) - 1):
+        parts = []
+        for j in range(out_offsets[t], out_offsets[t + 1]):
+            s = out_src[j]
+            parts.append(tokens[s] if s >= 0 else str(out_value[j]))
+        results.append(' '.join(parts))
+    return results
+
+def _python_tree(tokens):
+    # Imported here since binexp_parser only loads this module on demand
+    from binexp_parser import BinOpAst
+    return BinOpAst(tokens)
+
+class FlatAst:
+    """
+    A BinOpAst stored as flat arrays. Supports simplify_binops and prefix_str with the same
+    results as BinOpAst. Trees with a number that has a leading zero or a value that does not
+    fit in 64 bits are handed to a BinOpAst, kept in tree.
+    """
+
+    __slots__ = ('tokens', 'tree', 'op', 'left', 'right', 'value', 'src')
+
+    def __init__(self, prefix_list):
+        self.tokens = list(prefix_list)
+        self.tree = None
+        try:
+            codes, nums = encode(self.tokens)
+        except (OverflowError, ValueError):
+            self.tree = _python_tree(self.tokens)
+            return
+        self.op, self.left, self.right, self.value, self.src = build(codes, nums)
+
+    def simplify_binops(self):
+        if self.tree is None:
+            try:
+                simplify(self.op, self.left, self.right, self.value, self.src)
+                return
+            except OverflowError:
+                self.tree = _python_tree(self.tokens)
+        self.tree.simplify_binops()
+
+    def prefix_str(self):
+        """
+        Convert the FlatAst to a prefix notation string.
+        """
+        if self.tree is not None:
+            return self.tree.prefix_str()
+        tokens = self.tokens
+        src = self.src
+        value = self.value
+        parts = []
+        for i in prefix_order(self.op, self.left, self.right):
+            s = src[i]
+            parts.append(tokens[s] if s >= 0 else str(value[i]))
+        return ' '.join(parts)
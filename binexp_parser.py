@@ -1,145 +1,473 @@
 #!/usr/bin/python3
+import functools
+import importlib.util
 import os
 from os.path import join as osjoin
+import operator
+import sys
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
-# Node type enumeration for distinguishing between numbers and operators
+# binexp_flat pulls in NumPy and Numba, so only the tests that use it import it
+_HAVE_NUMPY = importlib.util.find_spec('numpy') is not None
+
+try:
+    import _binexp_ext
+except ImportError:
+    _binexp_ext = None
+
+# Node type enumeration, kept for callers of BinOpAst.type; nodes expose is_num
 NodeType = Enum('BinOpNodeType', ['number', 'operator'])
 
+# First characters of a numeric token; tokens are ASCII integers
+_DIGITS = frozenset('0123456789')
+
+# Operator codes assigned at parse time; _NO_OP marks leaves and operators with no rules
+_ADD, _SUB, _MUL, _DIV = 0, 1, 2, 3
+_NO_OP = -1
+_OP_CODES = {'+': _ADD, '-': _SUB, '*': _MUL, '/': _DIV}
+
+# Small-int codes for the leaf tokens '0' to '255', which are also the interned leaves; the
+# code is the token's value, so the identity rules compare against 0 and 1. Operators and
+# any other numeric token use _NO_VAL.
+_INTERN_LIMIT = 256
+_VAL_ZERO, _VAL_ONE = 0, 1
+_NO_VAL = -1
+_VAL_CODES = {str(i): i for i in range(_INTERN_LIMIT)}
+
+# Integer implementations of the operators that constant_fold can evaluate
+_OPS = {_ADD: operator.add, _SUB: operator.sub, _MUL: operator.mul, _DIV: operator.floordiv}
+
 class BinOpAst:
     """
     A binary operator AST that can be initialized from a list of tokens in prefix notation.
+    Nodes are instances of the NumberNode and OpNode subclasses, which each implement the
+    traversal methods for their own kind of node.
     """
 
+    # Fixed per-node fields; avoids a __dict__ on every node. Both subclasses share this
+    # layout so a node can be turned into the other kind in place.
+    __slots__ = ('val', 'left', 'right', 'op_code', 'val_code')
+
     def __init__(self, prefix_list):
-        if not prefix_list:
+        self._replace_node_with(BinOpAst.from_prefix(prefix_list))
+
+    @classmethod
+    def from_prefix(cls, tokens):
+        """
+        Build a BinOpAst from prefix tokens in a single iterative pass.
+        Tokens are consumed front to back from any iterable, and each operator
+        pushes its right then left child slot onto a stack so the left subtree
+        is filled first. Numeric tokens become shared leaves from leaf().
+        """
+        tokens = iter(tokens)
+        val = next(tokens, None)
+        if val is None:
             raise ValueError("Cannot initialize BinOpAst with an empty prefix list.")
-        self.val = prefix_list.pop(0)
-        if self.val.isnumeric():
-            self.type = NodeType.number
-            self.left = None
-            self.right = None
-        else:
-            self.type = NodeType.operator
-            self.left = BinOpAst(prefix_list)
-            self.right = BinOpAst(prefix_list)
-
-    def __str__(self, indent=0):
+        root = parent = None
+        slot = 0
+        stack = []
+        while True:
+            if val and val[0] in _DIGITS:
+                node = _LEAF_CACHE.get(val)
+                if node is None:
+                    node = NumberNode(val)
+            else:
+                node = object.__new__(OpNode)
+                node.val = val
+                node.op_code = _OP_CODES.get(val, _NO_OP)
+                node.val_code = _NO_VAL
+                node.left = None
+                node.right = None
+                stack.append((node, 1))
+                stack.append((node, 0))
+            if parent is None:
+                root = node
+            elif slot == 0:
+                parent.left = node
+            else:
+                parent.right = node
+            if not stack:
+                if root.is_num:
+                    # Never hand out an interned leaf as a tree of its own
+                    return NumberNode(root.val)
+                return root
+            val = next(tokens, None)
+            if val is None:
+                raise ValueError("Ran out of tokens while building BinOpAst.")
+            parent, slot = stack.pop()
+
+    @property
+    def type(self):
+        """
+        The NodeType of this node, derived from is_num.
+        """
+        return NodeType.number if self.is_num else NodeType.operator
+
+    def pretty(self, indent=0):
         """
         Converts the binary tree to a string with indentation representing hierarchy.
         """
         ilvl = '  ' * indent
-        left = f'\n{ilvl}{self.left.__str__(indent + 1)}' if self.left else ''
-        right = f'\n{ilvl}{self.right.__str__(indent + 1)}' if self.right else ''
+        left = f'\n{ilvl}{self.left.pretty(indent + 1)}' if self.left else ''
+        right = f'\n{ilvl}{self.right.pretty(indent + 1)}' if self.right else ''
         return f"{ilvl}{self.val}{left}{right}"
 
+    def __str__(self):
+        return self.pretty()
+
+    def __repr__(self):
+        # Only describes this node, so debuggers and loggers never format the whole tree
+        return f"<{type(self).__name__} {self.val!r} @ {id(self):x}>"
+
+    # ;;> Excellent use of a helper function here
+    def _replace_node_with(self, other):
+        """
+        Replaces the current node with another node.
+        """
+        self.__class__ = other.__class__
+        self.val = other.val
+        self.op_code = other.op_code
+        self.val_code = other.val_code
+        self.left = other.left
+        self.right = other.right
+
+    # Simplifies binary operations and folds constants in a single bottom-up pass
+    def simplify_binops(self):
+        self._simplify()
+
+class NumberNode(BinOpAst):
+    """
+    A numeric leaf of a BinOpAst. Every traversal stops here.
+    """
+
+    __slots__ = ()
+    is_num = True
+
+    def __init__(self, val):
+        self.val = val
+        self.op_code = _NO_OP
+        self.val_code = _VAL_CODES.get(val, _NO_VAL)
+        self.left = None
+        self.right = None
+
+    def prefix_str(self):
+        return self.val
+
+    def infix_str(self):
+        return self.val
+
+    def postfix_str(self):
+        return self.val
+
+    def additive_identity(self):
+        pass
+
+    def multiplicative_identity(self):
+        pass
+
+    def mult_by_zero(self):
+        pass
+
+    def constant_fold(self):
+        pass
+
+    def _simplify(self):
+        pass
+
+# Interned leaves for the tokens in _VAL_CODES; see leaf()
+_LEAF_CACHE = {val: NumberNode(val) for val in _VAL_CODES}
+
+def leaf(val):
+    """
+    Return the shared NumberNode for val if it is one of the interned tokens '0' to '255',
+    otherwise a new NumberNode. Interned leaves are shared between trees, so they must never
+    be modified in place; the simplification rules only ever rewrite operator nodes.
+    """
+    node = _LEAF_CACHE.get(val)
+    if node is None:
+        node = NumberNode(val)
+    return node
+
+ZERO = _LEAF_CACHE['0']
+ONE = _LEAF_CACHE['1']
+
+# Folded leaf (or None when unfoldable) keyed by (operator code, left value code, right value
+# code). Only folds of two interned leaves are cached, which bounds its size.
+_FOLD_CACHE = {}
+
+def _fold(op_code, lval, rval):
+    """
+    Evaluate the operator on two numeric tokens and return a leaf for the result, or None if it
+    cannot be folded. Division by zero and negative results are left unfolded since a
+    negative number is not a valid token.
+    """
+    fn = _OPS.get(op_code)
+    if fn is None:
+        return None
+    rnum = int(rval)
+    if rnum == 0 and fn is operator.floordiv:
+        return None
+    result = fn(int(lval), rnum)
+    if result < 0:
+        return None
+    return leaf(str(result))
+
+class OpNode(BinOpAst):
+    """
+    A binary operator node of a BinOpAst with left and right operands.
+    """
+
+    __slots__ = ()
+    is_num = False
+
+    def __init__(self, val, left, right):
+        self.val = val
+        self.op_code = _OP_CODES.get(val, _NO_OP)
+        self.val_code = _NO_VAL
+        self.left = left
+        self.right = right
+
     def prefix_str(self):
         """
         Convert the BinOpAst to a prefix notation string.
         """
-        if self.type == NodeType.number:
-            return self.val
-        return f"{self.val} {self.left.prefix_str()} {self.right.prefix_str()}"
+        # Follow left children directly and only stack the pending right subtrees, so a
+        # right-leaning chain never holds more than one entry on the stack
+        parts = []
+        append = parts.append
+        stack = []
+        node = self
+        while True:
+            append(node.val)
+            if not node.is_num:
+                stack.append(node.right)
+                node = node.left
+            elif stack:
+                node = stack.pop()
+            else:
+                return ' '.join(parts)
 
     def infix_str(self):
         """
         Convert the BinOpAst to an infix notation string.
         """
-        if self.type == NodeType.number:
-            return self.val
-        return f"({self.left.infix_str()} {self.val} {self.right.infix_str()})"
+        parts = []
+        stack = [self]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            item = pop()
+            if isinstance(item, str):
+                parts.append(item)
+            elif item.is_num:
+                parts.append(item.val)
+            else:
+                push(')')
+                push(item.right)
+                push(f' {item.val} ')
+                push(item.left)
+                push('(')
+        return ''.join(parts)
 
     def postfix_str(self):
         """
         Convert the BinOpAst to a postfix notation string.
         """
-        if self.type == NodeType.number:
-            return self.val
-        return f"{self.left.postfix_str()} {self.right.postfix_str()} {self.val}"
+        parts = []
+        stack = [(self, False)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node, visited = pop()
+            if visited or node.is_num:
+                parts.append(node.val)
+            else:
+                push((node, True))
+                push((node.right, False))
+                push((node.left, False))
+        return ' '.join(parts)
 
     # Additive identity reduction
     def additive_identity(self):
-        if self.type == NodeType.number:
-            return
-        self.left.additive_identity()
-        self.right.additive_identity()
-        if self.val == '*' or self.val == '/':
-            return
-        # ;;> This is a bit dangerous because you are assuming that '+' is the only thing left at this point
-        # ;;> It would be better to check for '+' and then ignore everything else to make the code more
-        # ;;> extensible in the future. E.g. imagine how hard it would be to extend your program if we added
-        # ;;> new operators, like ^ or added identifiers.
-        if self.left.val == '0':
-            self._replace_node_with(self.right)
-        elif self.right.val == '0':
-            self._replace_node_with(self.left)
+        self._rewrite_post_order(OpNode._additive_rule)
 
     # Multiplicative identity reduction
     def multiplicative_identity(self):
-        if self.type == NodeType.number:
-            return
-        self.left.multiplicative_identity()
-        self.right.multiplicative_identity()
-        if self.val == '+':
-            return
-        if self.left.val == '1':
-            self._replace_node_with(self.right)
-        elif self.right.val == '1':
-            self._replace_node_with(self.left)
+        self._rewrite_post_order(OpNode._multiplicative_rule)
 
     # Multiplication by zero reduction
     def mult_by_zero(self):
-        if self.type == NodeType.number:
-            return
-        self.left.mult_by_zero()
-        self.right.mult_by_zero()
-        if self.val == '*' and (self.left.val == '0' or self.right.val == '0'):
-            self._replace_node_with(BinOpAst(['0']))
+        self._rewrite_post_order(OpNode._mult_by_zero_rule)
 
-    # ;;> Excellent use of a helper function here
-    def _replace_node_with(self, other):
+    def constant_fold(self):
         """
-        Replaces the current node with another node.
+        Fold constants (e.g., 1 + 2 = 3).
         """
-        self.val = other.val
-        self.type = other.type
-        self.left = other.left
-        self.right = other.right
+        self._rewrite_post_order(OpNode._fold_rule)
 
-    # Simplifies binary operations
-    def simplify_binops(self):
-        self.additive_identity()
-        self.multiplicative_identity()
-        self.mult_by_zero()
-        self.constant_fold()
+    def _simplify(self):
+        self._rewrite_post_order(OpNode._simplify_rule)
 
-    def constant_fold(self):
+    def _rewrite_post_order(self, rule):
         """
-        Fold constants (e.g., 1 + 2 = 3).
+        Apply rule to every operator node below and including this one, children first.
+        A rule returns the node that should take its place, or None to keep it. Replacements
+        are linked into the parent's slot; only this root falls back to copying fields.
+        Uses an explicit stack of (node, parent, slot, visited) entries so deep trees do not
+        recurse.
         """
-        # Optional implementation
-        pass
+        stack = [(self, None, 0, False)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node, parent, slot, visited = pop()
+            if visited:
+                replacement = rule(node)
+                if replacement is None:
+                    continue
+                if parent is None:
+                    self._replace_node_with(replacement)
+                elif slot == 0:
+                    parent.left = replacement
+                else:
+                    parent.right = replacement
+            elif not node.is_num:
+                push((node, parent, slot, True))
+                push((node.right, node, 1, False))
+                push((node.left, node, 0, False))
+
+    # Only 0 + x, x + 0 and x - 0 are identities
+    def _additive_rule(self):
+        # ;;> This is a bit dangerous because you are assuming that '+' is the only thing left at this point
+        # ;;> It would be better to check for '+' and then ignore everything else to make the code more
+        # ;;> extensible in the future. E.g. imagine how hard it would be to extend your program if we added
+        # ;;> new operators, like ^ or added identifiers.
+        op = self.op_code
+        if op == _ADD and self.left.val_code == _VAL_ZERO:
+            return self.right
+        if (op == _ADD or op == _SUB) and self.right.val_code == _VAL_ZERO:
+            return self.left
+        return None
+
+    # Only 1 * x, x * 1 and x / 1 are identities
+    def _multiplicative_rule(self):
+        op = self.op_code
+        if op == _MUL and self.left.val_code == _VAL_ONE:
+            return self.right
+        if (op == _MUL or op == _DIV) and self.right.val_code == _VAL_ONE:
+            return self.left
+        return None
+
+    def _mult_by_zero_rule(self):
+        if self.op_code == _MUL and (self.left.val_code == _VAL_ZERO or self.right.val_code == _VAL_ZERO):
+            return ZERO
+        return None
+
+    def _fold_rule(self):
+        """
+        Return the folded leaf for this node if both operands are numbers.
+        """
+        left = self.left
+        right = self.right
+        if not (left.is_num and right.is_num):
+            return None
+        lcode = left.val_code
+        rcode = right.val_code
+        if lcode == _NO_VAL or rcode == _NO_VAL:
+            return _fold(self.op_code, left.val, right.val)
+        key = (self.op_code, lcode, rcode)
+        try:
+            return _FOLD_CACHE[key]
+        except KeyError:
+            folded = _FOLD_CACHE[key] = _fold(self.op_code, left.val, right.val)
+            return folded
+
+    def _simplify_rule(self):
+        """
+        Apply the multiplication by zero, additive identity, multiplicative identity and
+        constant folding rules to this node, in that order, returning the first replacement.
+        """
+        op = self.op_code
+        left = self.left
+        right = self.right
+        lcode = left.val_code
+        rcode = right.val_code
+        if op == _MUL and (lcode == _VAL_ZERO or rcode == _VAL_ZERO):
+            return ZERO
+        if op == _ADD:
+            if lcode == _VAL_ZERO:
+                return right
+            if rcode == _VAL_ZERO:
+                return left
+        elif op == _SUB:
+            if rcode == _VAL_ZERO:
+                return left
+        elif op == _MUL:
+            if lcode == _VAL_ONE:
+                return right
+            if rcode == _VAL_ONE:
+                return left
+        elif op == _DIV:
+            if rcode == _VAL_ONE:
+                return left
+        return self._fold_rule()
+
+def simplify_prefix(prefix):
+    """
+    Parse a prefix expression string, apply simplify_binops and return the result in prefix
+    notation. Uses the native _binexp_ext module when it is built, falling back to BinOpAst when
+    it is missing or a value does not fit in 64 bits.
+    """
+    if _binexp_ext is not None:
+        try:
+            return _binexp_ext.simplify_prefix(prefix)
+        except OverflowError:
+            pass
+    tree = BinOpAst(prefix.split())
+    tree.simplify_binops()
+    return tree.prefix_str()
+
+def _read_case(input_files, output_files, file_name):
+    """
+    Read one (file name, input tokens, expected output) case. An empty input file yields
+    None tokens so the caller can report it as skipped.
+    """
+    with open(osjoin(input_files, file_name)) as f:
+        input_to_test = f.read().strip()
+    if not input_to_test:
+        return (file_name, None, None)
+    with open(osjoin(output_files, file_name)) as f:
+        expected_output = f.read().strip()
+    return (file_name, tuple(input_to_test.split()), expected_output)
+
+@functools.lru_cache(maxsize=None)
+def _load_testbench(test_name):
+    """
+    Read every case for a testbench once, sorted by file name. Files are read on a thread
+    pool so the open/read syscalls of large testbenches overlap.
+    """
+    input_files = osjoin(f'testbench/{test_name}', 'inputs')
+    output_files = osjoin(f'testbench/{test_name}', 'outputs')
+    with os.scandir(input_files) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file())
+    with ThreadPoolExecutor() as ex:
+        return tuple(ex.map(functools.partial(_read_case, input_files, output_files), names))
 
 class TreeOpTester(unittest.TestCase):
 
-    def run_test_case(self, test_name, operation):
+    def run_test_case(self, test_name, operation, build=None):
         print(f"\nTesting {test_name}")
-        input_files = osjoin(f'testbench/{test_name}', 'inputs')
-        output_files = osjoin(f'testbench/{test_name}', 'outputs')
         log = []
         flag = True
 
-        for file_name in os.listdir(input_files):
-            with open(osjoin(input_files, file_name)) as f:
-                input_to_test = f.read().strip()
-            if not input_to_test:
+        for file_name, tokens, expected_output in _load_testbench(test_name):
+            if tokens is None:
                 print(f"Skipping empty input file: {file_name}")
                 continue
-            with open(osjoin(output_files, file_name)) as f:
-                expected_output = f.read().strip()
 
-            tree = BinOpAst(input_to_test.split())
+            tree = (build or BinOpAst)(tokens)
             operation(tree)
             actual_output = tree.prefix_str()
 
@@ -164,5 +492,83 @@ class TreeOpTester(unittest.TestCase):
     def test_mult_by_zero(self):
         self.run_test_case('mult_by_zero', lambda tree: tree.mult_by_zero())
 
+    def test_constant_fold(self):
+        self.run_test_case('constant_fold', lambda tree: tree.constant_fold())
+
+    def test_combined(self):
+        self.run_test_case('combined', lambda tree: tree.simplify_binops())
+
+    def test_notation_strings(self):
+        tree = BinOpAst('+ * 1 2 - 3 4'.split())
+        self.assertEqual(tree.prefix_str(), '+ * 1 2 - 3 4')
+        self.assertEqual(tree.infix_str(), '((1 * 2) + (3 - 4))')
+        self.assertEqual(tree.postfix_str(), '1 2 * 3 4 - +')
+
+    def test_empty_token(self):
+        # An empty token is not a number, so it parses as an operator
+        tree = BinOpAst(['', '1', '2'])
+        self.assertFalse(tree.is_num)
+        self.assertEqual(tree.postfix_str(), '1 2 ')
+
+    def test_deep_trees(self):
+        depth = sys.getrecursionlimit() + 100
+        right_chain = ['^', '2'] * depth + ['3']
+        left_chain = ['^'] * depth + ['2'] * (depth + 1)
+        for tokens in (right_chain, left_chain):
+            tree = BinOpAst(tokens)
+            self.assertEqual(tree.prefix_str(), ' '.join(tokens))
+            infix = tree.infix_str()
+            self.assertEqual(infix.count('('), depth)
+            self.assertEqual(infix.count('^'), depth)
+            postfix = tree.postfix_str().split()
+            self.assertEqual(len(postfix), len(tokens))
+            self.assertEqual(postfix[-1], '^')
+            tree.simplify_binops()
+            self.assertEqual(tree.prefix_str(), ' '.join(tokens))
+
+        tree = BinOpAst(['+'] * depth + ['1'] * (depth + 1))
+        tree.simplify_binops()
+        self.assertEqual(tree.prefix_str(), str(depth + 1))
+
+    def test_pass_after_graft(self):
+        tree = BinOpAst('+ 1 2'.split())
+        tree.right = BinOpAst('* 0 5'.split())
+        tree.mult_by_zero()
+        self.assertEqual(tree.prefix_str(), '+ 1 0')
+
+        tree = BinOpAst('* 3 4'.split())
+        tree.right = BinOpAst('+ 0 5'.split())
+        tree.additive_identity()
+        self.assertEqual(tree.prefix_str(), '* 3 5')
+
+    def test_pass_after_inner_rewrite(self):
+        tree = BinOpAst('+ 7 - 3 3'.split())
+        tree.right.constant_fold()
+        tree.additive_identity()
+        self.assertEqual(tree.prefix_str(), '7')
+
+        tree = OpNode('*', leaf('7'), OpNode('-', leaf('3'), leaf('2')))
+        tree.right.constant_fold()
+        tree.multiplicative_identity()
+        self.assertEqual(tree.prefix_str(), '7')
+
+    @unittest.skipIf(not _HAVE_NUMPY, "numpy is not installed")
+    def test_flat_combined(self):
+        from binexp_flat import FlatAst
+        self.run_test_case('combined', lambda tree: tree.simplify_binops(), FlatAst)
+
+    @unittest.skipIf(not _HAVE_NUMPY, "numpy is not installed")
+    def test_flat_batch_combined(self):
+        from binexp_flat import simplify_batch
+        cases = [case for case in _load_testbench('combined') if case[1] is not None]
+        outputs = simplify_batch([tokens for _, tokens, _ in cases])
+        for (file_name, _, expected_output), actual_output in zip(cases, outputs):
+            self.assertEqual(actual_output, expected_output, file_name)
+
+    def test_simplify_prefix(self):
+        for file_name, tokens, expected_output in _load_testbench('combined'):
+            if tokens is not None:
+                self.assertEqual(simplify_prefix(' '.join(tokens)), expected_output, file_name)
+
 if __name__ == "__main__":
     unittest.main()
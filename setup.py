@@ -0,0 +1,12 @@
+# Builds the optional native simplifier: python setup.py build_ext --inplace
+from pybind11.setup_helpers import Pybind11Extension, build_ext
+from setuptools import setup
+
+setup(
+    name='binexp_parser',
+    py_modules=['binexp_parser', 'binexp_flat'],
+    # binexp_flat needs NumPy, and compiles its kernels when Numba is also installed
+    extras_require={'flat': ['numpy'], 'numba': ['numpy', 'numba']},
+    ext_modules=[Pybind11Extension('_binexp_ext', ['_binexp_ext.cpp'], cxx_std=17)],
+    cmdclass={'build_ext': build_ext},
+)